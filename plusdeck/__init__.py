@@ -1,18 +1,21 @@
-from plusdeck.client import (
-    Client,
-    Command,
-    connection,
-    ConnectionError,
-    create_connection,
-    Handler,
-    PlusDeckError,
-    Receiver,
-    State,
-    StateError,
-    StateHandler,
-    SubscriptionError,
-)
-from plusdeck.config import Config
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from plusdeck.client import (
+        Client,
+        Command,
+        connection,
+        ConnectionError,
+        create_connection,
+        Handler,
+        PlusDeckError,
+        Receiver,
+        State,
+        StateError,
+        StateHandler,
+        SubscriptionError,
+    )
+    from plusdeck.config import Config
 
 __all__ = [
     "Client",
@@ -29,3 +32,18 @@ __all__ = [
     "StateHandler",
     "SubscriptionError",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    # The client is imported on first access, so that importing submodules -
+    # such as the CLI - doesn't pay for asyncio and pyserial unless they're used
+    if name == "Config":
+        from plusdeck.config import Config
+
+        return Config
+    elif name in __all__:
+        import plusdeck.client
+
+        return getattr(plusdeck.client, name)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,25 +1,41 @@
-import asyncio
-from dataclasses import asdict, dataclass, is_dataclass
+from dataclasses import dataclass, fields, is_dataclass
 from enum import Enum
 import functools
-import json
 import logging
 import os
 import sys
-from typing import Any, Callable, Coroutine, List, Literal, Optional, Self, TypeVar
+from typing import (
+    Any,
+    Callable,
+    Coroutine,
+    Dict,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Self,
+    Set,
+    Tuple,
+    TYPE_CHECKING,
+    TypeVar,
+)
 
 import click
-from serial.serialutil import SerialException
 
-from plusdeck.client import Client, create_connection, State
 from plusdeck.config import Config, GLOBAL_FILE
+from plusdeck.protocol import State
+
+# The client - and with it asyncio and pyserial - is only imported by commands
+# which connect to the Plus Deck 2C
+if TYPE_CHECKING:
+    from plusdeck.client import Client
 
 logger = logging.getLogger(__name__)
 
 OutputMode = Literal["text"] | Literal["json"]
 
 
-@dataclass
+@dataclass(slots=True)
 class Obj:
     """
     The main click context object. Contains options collated from parameters and the
@@ -39,8 +55,19 @@ LogLevel = (
     | Literal["ERROR"]
     | Literal["CRITICAL"]
 )
+LOG_LEVELS: Dict[LogLevel, int] = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+    "CRITICAL": logging.CRITICAL,
+}
+LOG_LEVEL = click.Choice(list(LOG_LEVELS))
+
+OUTPUT = click.Choice(["text", "json"])
 
-STATES: List[str] = [state.name for state in State]
+STATES: List[str] = list(State.__members__)
+_STATES_BY_NAME: Mapping[str, State] = State.__members__
 
 
 class PlusdeckState(click.Choice):
@@ -61,51 +88,107 @@ class PlusdeckState(click.Choice):
     ) -> State:
         choice = super().convert(value, param, ctx)
 
-        return State[choice]
+        return _STATES_BY_NAME[choice]
 
 
 STATE = PlusdeckState()
 
 
+# Types which are already JSON-serializable as-is
+_ATOMIC_TYPES: Set[type] = {str, int, float, bool, type(None)}
+
+# Field names for dataclasses, cached by class
+_FIELD_NAMES: Dict[type, Tuple[str, ...]] = dict()
+
+
+def _field_names(cls: type) -> Tuple[str, ...]:
+    names = _FIELD_NAMES.get(cls)
+    if names is None:
+        names = tuple(f.name for f in fields(cls))
+        _FIELD_NAMES[cls] = names
+    return names
+
+
 def as_json(obj: Any) -> Any:
     """
     Convert an object into something that is JSON-serializable.
     """
 
-    if isinstance(obj, Enum):
+    if type(obj) in _ATOMIC_TYPES:
+        return obj
+    elif isinstance(obj, Enum):
         return obj.name
     elif is_dataclass(obj.__class__):
-        return asdict(obj)
+        # Unlike dataclasses.asdict, this doesn't deep copy field values
+        return {name: as_json(getattr(obj, name)) for name in _field_names(type(obj))}
     elif hasattr(obj, "as_dict"):
         return obj.as_dict()
+    elif isinstance(obj, (list, tuple)):
+        return [as_json(item) for item in obj]
+    elif isinstance(obj, dict):
+        return {key: as_json(value) for key, value in obj.items()}
     else:
         return obj
 
 
+try:
+    import orjson
+
+    def _json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8")
+
+except ImportError:
+    import json
+
+    def _json_dumps(obj: Any) -> str:
+        return json.dumps(obj, indent=2)
+
+
+# Text formatters for types which aren't shown with their repr, keyed by type
+_TEXT_FORMATTERS: Dict[type, Callable[[Any], str]] = {
+    str: str,
+    State: lambda state: state.name,
+}
+
+
 class Echo:
     """
     An abstraction for writing output to the terminal. Used to support the
     behavior of the --output flag.
     """
 
-    mode: OutputMode = "text"
+    _mode: OutputMode
+    _emit: Callable[..., None]
+
+    def __init__(self: Self) -> None:
+        self.mode = "text"
+
+    @property
+    def mode(self: Self) -> OutputMode:
+        return self._mode
+
+    @mode.setter
+    def mode(self: Self, mode: OutputMode) -> None:
+        # Choose how to write output once, rather than on every call
+        self._mode = mode
+        self._emit = self._emit_json if mode == "json" else self._emit_text
 
     def __call__(self: Self, obj: Any, *args, **kwargs) -> None:
-        if self.mode == "json":
-            try:
-                click.echo(json.dumps(as_json(obj), indent=2), *args, **kwargs)
-            except Exception as exc:
-                logger.debug(exc)
-                click.echo(json.dumps(repr(obj)), *args, **kwargs)
-        else:
-            if isinstance(obj, State):
-                obj = obj.name
-
-            click.echo(
-                obj if isinstance(obj, str) else repr(obj),
-                *args,
-                **kwargs,
-            )
+        self._emit(obj, *args, **kwargs)
+
+    def _emit_json(self: Self, obj: Any, *args, **kwargs) -> None:
+        try:
+            click.echo(_json_dumps(as_json(obj)), *args, **kwargs)
+        except Exception as exc:
+            logger.debug(exc)
+            click.echo(_json_dumps(repr(obj)), *args, **kwargs)
+
+    def _emit_text(self: Self, obj: Any, *args, **kwargs) -> None:
+        fmt = _TEXT_FORMATTERS.get(type(obj))
+        if fmt is None:
+            # Subclasses of str are written as-is, like str itself
+            fmt = str if isinstance(obj, str) else repr
+        click.echo(fmt(obj), *args, **kwargs)
 
 
 echo = Echo()
@@ -114,6 +197,26 @@ AsyncCommand = Callable[..., Coroutine[None, None, None]]
 SyncCommand = Callable[..., None]
 
 
+def run(coro: Coroutine[None, None, None]) -> None:
+    """
+    Run a coroutine in a new event loop. Uses uvloop if it's installed.
+    """
+
+    import asyncio
+
+    # uvloop is an optional speedup - fall back to the default event loop
+    # when it isn't installed
+    try:
+        import uvloop
+    except ImportError:
+        loop_factory = None
+    else:
+        loop_factory = uvloop.new_event_loop
+
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        runner.run(coro)
+
+
 def async_command(fn: AsyncCommand) -> SyncCommand:
     """
     Run an async command handler.
@@ -122,7 +225,7 @@ def async_command(fn: AsyncCommand) -> SyncCommand:
     @functools.wraps(fn)
     def wrapped(*args, **kwargs) -> None:
         try:
-            asyncio.run(fn(*args, **kwargs))
+            run(fn(*args, **kwargs))
         except KeyboardInterrupt:
             pass
 
@@ -134,6 +237,10 @@ def pass_client(run_forever: bool = False) -> Callable[[AsyncCommand], AsyncComm
         @click.pass_obj
         @functools.wraps(fn)
         async def wrapped(obj: Obj, *args, **kwargs) -> None:
+            from serial.serialutil import SerialException
+
+            from plusdeck.client import create_connection
+
             port: str = obj.port
 
             try:
@@ -181,7 +288,7 @@ def pass_config(fn: Callable[..., R]) -> Callable[..., R]:
 @click.option(
     "--log-level",
     envvar="PLUSDECK_LOG_LEVEL",
-    type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]),
+    type=LOG_LEVEL,
     default="INFO",
     help="Set the log level",
 )
@@ -192,7 +299,7 @@ def pass_config(fn: Callable[..., R]) -> Callable[..., R]:
 )
 @click.option(
     "--output",
-    type=click.Choice(["text", "json"]),
+    type=OUTPUT,
     default="text",
     help="Output either human-friendly text or JSON",
 )
@@ -209,7 +316,7 @@ def main(
     Control your Plus Deck 2C tape deck.
     """
 
-    logging.basicConfig(level=getattr(logging, log_level))
+    logging.basicConfig(level=LOG_LEVELS[log_level])
 
     file = None
     if config_file:
@@ -304,7 +411,7 @@ def play() -> None:
 @play.command(name="a")
 @async_command
 @pass_client()
-async def play_a(client: Client) -> None:
+async def play_a(client: "Client") -> None:
     """
     Play side A of the tape
     """
@@ -315,7 +422,7 @@ async def play_a(client: Client) -> None:
 @play.command(name="b")
 @async_command
 @pass_client()
-async def play_b(client: Client) -> None:
+async def play_b(client: "Client") -> None:
     """
     Play side B of the tape
     """
@@ -333,7 +440,7 @@ def fast_forward() -> None:
 @fast_forward.command(name="a")
 @async_command
 @pass_client()
-async def fast_forward_a(client: Client) -> None:
+async def fast_forward_a(client: "Client") -> None:
     """
     Fast-forward side A of the tape
     """
@@ -344,7 +451,7 @@ async def fast_forward_a(client: Client) -> None:
 @fast_forward.command(name="b")
 @async_command
 @pass_client()
-async def fast_forward_b(client: Client) -> None:
+async def fast_forward_b(client: "Client") -> None:
     """
     Fast-forward side B of the tape
     """
@@ -362,7 +469,7 @@ def rewind() -> None:
 @rewind.command(name="a")
 @async_command
 @pass_client()
-async def rewind_a(client: Client) -> None:
+async def rewind_a(client: "Client") -> None:
     """
     Rewind side A of the tape
     """
@@ -373,7 +480,7 @@ async def rewind_a(client: Client) -> None:
 @rewind.command(name="b")
 @async_command
 @pass_client()
-async def rewind_b(client: Client) -> None:
+async def rewind_b(client: "Client") -> None:
     """
     Rewind side B of the tape
     """
@@ -384,7 +491,7 @@ async def rewind_b(client: Client) -> None:
 @main.command
 @async_command
 @pass_client()
-async def pause(client: Client) -> None:
+async def pause(client: "Client") -> None:
     """
     Pause the tape
     """
@@ -395,7 +502,7 @@ async def pause(client: Client) -> None:
 @main.command
 @async_command
 @pass_client()
-async def stop(client: Client) -> None:
+async def stop(client: "Client") -> None:
     """
     Stop the tape
     """
@@ -406,7 +513,7 @@ async def stop(client: Client) -> None:
 @main.command
 @async_command
 @pass_client()
-async def eject(client: Client) -> None:
+async def eject(client: "Client") -> None:
     """
     Eject the tape
     """
@@ -423,7 +530,7 @@ async def eject(client: Client) -> None:
 )
 @async_command
 @pass_client()
-async def expect(client: Client, state: State, timeout: Optional[float]) -> None:
+async def expect(client: "Client", state: State, timeout: Optional[float]) -> None:
     """
     Wait for an expected state
     """
@@ -439,11 +546,13 @@ async def expect(client: Client, state: State, timeout: Optional[float]) -> None
 @click.option("--for", "for_", type=float, help="Amount of time to listen for reports")
 @async_command
 @pass_client(run_forever=True)
-async def subscribe(client: Client, for_: Optional[float]) -> None:
+async def subscribe(client: "Client", for_: Optional[float]) -> None:
     """
     Subscribe to state changes
     """
 
+    import asyncio
+
     running = True
 
     async def subscribe() -> None:
@@ -1,14 +1,16 @@
 # -*- coding: utf-8 -*-
 
 import asyncio
+from collections import deque
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
-from enum import Enum
-from typing import Callable, List, Optional, Self, Set, Tuple, Type
+from typing import Callable, cast, Deque, Dict, List, Optional, Self, Tuple
 
 from pyee.asyncio import AsyncIOEventEmitter
 from serial import EIGHTBITS, PARITY_NONE, STOPBITS_ONE
-from serial_asyncio import create_serial_connection, SerialTransport
+from serial_asyncio_fast import create_serial_connection, SerialTransport
+
+from plusdeck.protocol import _STATE_BY_CODE, Command, State
 
 """
 A client library for the Plus Deck 2C PC Cassette Deck.
@@ -39,63 +41,18 @@ class SubscriptionError(StateError):
     pass
 
 
-class Command(Enum):
-    """A command for the Plus Deck 2C PC Cassette Deck."""
-
-    PLAY_A = b"\x01"
-    PLAY_B = b"\x02"
-    FAST_FORWARD_A = b"\x03"
-    FAST_FORWARD_B = b"\x04"
-    PAUSE = b"\x05"
-    STOP = b"\x06"
-    EJECT = b"\x08"
-    SUBSCRIBE = b"\x0b"
-    UNSUBSCRIBE = b"\x0c"
-
-    @classmethod
-    def from_bytes(cls: Type["Command"], buffer: bytes) -> List["Command"]:
-        return [Command(code.to_bytes(length=1, byteorder="little")) for code in buffer]
-
-    @classmethod
-    def from_byte(cls: Type["Command"], buffer: bytes) -> "Command":
-        if len(buffer) != 1:
-            raise ValueError("Can not convert multiple bytes into a single Command")
-        return cls.from_bytes(buffer)[0]
-
-    def to_bytes(self: "Command") -> bytes:
-        return self.value
-
-
-class State(Enum):
-    """The state of the Plus Deck 2C PC Cassette Deck."""
-
-    PLAYING_A = 10
-    PAUSED_A = 12
-    PLAYING_B = 20
-    SUBSCRIBED = 21
-    PAUSED_B = 22
-    FAST_FORWARDING_A = 30
-    FAST_FORWARDING_B = 40
-    STOPPED = 50
-    EJECTED = 60
-    SUBSCRIBING = -1
-    UNSUBSCRIBING = -2
-    UNSUBSCRIBED = -3
-
-    @classmethod
-    def from_bytes(cls: Type["State"], buffer: bytes) -> List["State"]:
-        return [cls(code) for code in buffer]
-
-    @classmethod
-    def from_byte(cls: Type["State"], buffer: bytes) -> "State":
-        if len(buffer) != 1:
-            raise ValueError("Can not convert multiple bytes to a single State")
-        return cls.from_bytes(buffer)[0]
-
-    def to_bytes(self: "State") -> bytes:
-        if self.value < 0:
-            raise ValueError(f"Can not convert {self} to bytes")
-        return self.value.to_bytes()
+# Commands checked on every call to Client.send
+_SUBSCRIBE = Command.SUBSCRIBE
+_UNSUBSCRIBE = Command.UNSUBSCRIBE
+
+# States checked on every call to Client._on_state. Binding them at the module
+# level saves an attribute lookup on State for each comparison.
+_PAUSED_A = State.PAUSED_A
+_PAUSED_B = State.PAUSED_B
+_SUBSCRIBED = State.SUBSCRIBED
+_SUBSCRIBING = State.SUBSCRIBING
+_UNSUBSCRIBING = State.UNSUBSCRIBING
+_UNSUBSCRIBED = State.UNSUBSCRIBED
 
 
 Handler = Callable[[State], None]
@@ -104,25 +61,107 @@ StateHandler = Callable[[], None]
 Event = Tuple[Exception, None] | Tuple[None, State]
 
 
-class Receiver(asyncio.Queue[Event]):
+class Receiver:
     """Receive state change events from the Plus Deck 2C PC Cassette Deck."""
 
+    maxsize: int
     _client: "Client"
     _receiving: bool
+    _items: Deque[Event]
+    _overflow: Deque[Event]
+    _not_empty: asyncio.Event
+    _not_full: asyncio.Event
 
     def __init__(self: Self, client: "Client", maxsize=0) -> None:
-        super().__init__(maxsize)
+        self.maxsize = maxsize
         self._client = client
         self._receiving = True
+        self._items = deque()
+        self._overflow = deque()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+
+    def qsize(self: Self) -> int:
+        """Number of events in the receiver, including any held while full."""
+
+        return len(self._items) + len(self._overflow)
+
+    def empty(self: Self) -> bool:
+        """Whether or not there are no events waiting to be received."""
+
+        return not self._items
+
+    def full(self: Self) -> bool:
+        """Whether or not the receiver is full."""
+
+        return 0 < self.maxsize <= self.qsize()
+
+    def put_nowait(self: Self, event: Event) -> None:
+        """
+        Put an event into the receiver without blocking. Raises
+        asyncio.QueueFull if the receiver is full.
+        """
+
+        if self.full():
+            raise asyncio.QueueFull()
+        self._items.append(event)
+        self._not_empty.set()
+
+    async def put(self: Self, event: Event) -> None:
+        """Put an event into the receiver, waiting for room if it's full."""
+
+        while self.full():
+            self._not_full.clear()
+            await self._not_full.wait()
+        self.put_nowait(event)
+
+    def get_nowait(self: Self) -> Event:
+        """
+        Get an event from the receiver without blocking. Raises
+        asyncio.QueueEmpty if the receiver is empty.
+        """
+
+        if not self._items:
+            raise asyncio.QueueEmpty()
+        event = self._items.popleft()
+        if self._overflow:
+            # Events held while full take the freed slot, in order
+            self._items.append(self._overflow.popleft())
+        elif self.maxsize > 0:
+            self._not_full.set()
+        return event
+
+    def _offer(self: Self, event: Event) -> None:
+        # Deliver an event from the client. Bounded receivers hold events
+        # which don't fit until there's room, rather than dropping them. They
+        # stay behind any events already held, so that order is preserved.
+        if self._overflow or self.full():
+            self._overflow.append(event)
+        else:
+            self._items.append(event)
+            self._not_empty.set()
+
+    async def get(self: Self) -> Event:
+        """Get an event from the receiver, waiting for one if it's empty."""
+
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self.get_nowait()
 
     async def get_state(self: Self, timeout: Optional[float] = None) -> State:
-        async with asyncio.timeout(timeout):
-            exc, state = await super().get()
-            if exc:
-                raise exc
-            else:
-                assert state, "State must be defined"
-                return state
+        # Only schedule a timeout when there is one to enforce
+        if timeout is None:
+            exc, state = await self.get()
+        else:
+            async with asyncio.timeout(timeout):
+                exc, state = await self.get()
+
+        if exc:
+            raise exc
+        else:
+            assert state, "State must be defined"
+            return state
 
     async def expect(self: Self, state: State, timeout: Optional[float] = None) -> None:
         """
@@ -134,19 +173,21 @@ class Receiver(asyncio.Queue[Event]):
         while current != state:
             current = await self.get_state(timeout)
 
-    async def __aiter__(self: Self) -> AsyncGenerator[State, None]:
+    def __aiter__(self: Self) -> Self:
         """Iterate over state change events."""
 
-        while True:
-            if not self._receiving:
-                break
+        return self
+
+    async def __anext__(self: Self) -> State:
+        if not self._receiving:
+            raise StopAsyncIteration
 
-            state = await self.get_state()
+        state = await self.get_state()
 
-            yield state
+        if state is State.UNSUBSCRIBED:
+            self._receiving = False
 
-            if state == State.UNSUBSCRIBED:
-                self._receiving = False
+        return state
 
     def close(self: Self) -> None:
         """Close the receiver."""
@@ -154,7 +195,7 @@ class Receiver(asyncio.Queue[Event]):
         self._receiving = False
         try:
             self._client._receivers.remove(self)
-        except KeyError:
+        except ValueError:
             pass
 
 
@@ -165,8 +206,11 @@ class Client(asyncio.Protocol):
     events: AsyncIOEventEmitter
     _loop: asyncio.AbstractEventLoop
     _transport: SerialTransport | None
+    _write: Callable[[bytes], None] | None
     _connection_made: asyncio.Future[None]
-    _receivers: Set[Receiver]
+    _receivers: List[Receiver]
+    _state_listeners: Dict[State, List[Handler]]
+    _subscribed: Optional[asyncio.Future[None]]
 
     def __init__(
         self: Self,
@@ -177,9 +221,13 @@ class Client(asyncio.Protocol):
         self.state: State = State.UNSUBSCRIBED
         self.events: AsyncIOEventEmitter = AsyncIOEventEmitter(_loop)
         self.loop: asyncio.AbstractEventLoop = _loop
+        self._transport: SerialTransport | None = None
+        self._write: Callable[[bytes], None] | None = None
         self._connection_made: asyncio.Future[None] = self.loop.create_future()
         self._closed: asyncio.Future[None] = self.loop.create_future()
-        self._receivers: Set[Receiver] = set()
+        self._receivers: List[Receiver] = []
+        self._state_listeners: Dict[State, List[Handler]] = dict()
+        self._subscribed: Optional[asyncio.Future[None]] = None
 
     def connection_made(self: Self, transport: asyncio.BaseTransport):
         if not isinstance(transport, SerialTransport):
@@ -189,6 +237,7 @@ class Client(asyncio.Protocol):
             return
 
         self._transport = transport
+        self._write = transport.write
         self._connection_made.set_result(None)
 
     @property
@@ -222,7 +271,7 @@ class Client(asyncio.Protocol):
         receivers = self.receivers()
         if receivers:
             for rcv in receivers:
-                rcv.put_nowait((exc, None))
+                rcv._offer((exc, None))
             return
 
         self._close(exc)
@@ -232,15 +281,19 @@ class Client(asyncio.Protocol):
         Send a command to the Plus Deck 2C.
         """
 
-        if not self._transport:
+        write = self._write
+
+        if write is None:
             raise ConnectionError("Connection has not yet been made.")
 
-        if command == Command.SUBSCRIBE:
-            self._on_state(State.SUBSCRIBING)
-        elif command == Command.UNSUBSCRIBE:
-            self._on_state(State.UNSUBSCRIBING)
+        if command is _SUBSCRIBE:
+            self._on_state(_SUBSCRIBING)
+        elif command is _UNSUBSCRIBE:
+            self._on_state(_UNSUBSCRIBING)
 
-        self._transport.write(command.value)
+        # _value_ is the member's bytes, without going through the Enum's
+        # value property
+        write(command._value_)
 
     def play_a(self: Self) -> None:
         """
@@ -305,15 +358,25 @@ class Client(asyncio.Protocol):
         self.send(Command.EJECT)
 
     def data_received(self: Self, data) -> None:
+        on_state = self._on_state
         try:
-            for state in State.from_bytes(data):
-                self._on_state(state)
+            for code in data:
+                state = _STATE_BY_CODE[code]
+                if state is None:
+                    raise StateError(f"Unknown state code {code}")
+                on_state(state)
         except Exception as exc:
             self._error(exc)
 
     def _on_state(self: Self, state: State) -> None:
         previous = self.state
 
+        # The Plus Deck 2C repeats its current state on an interval, and a
+        # repeated state is a no-op - except while unsubscribing, when every
+        # state needs to be checked.
+        if state is previous and previous is not _UNSUBSCRIBING:
+            return
+
         # When turning off, what I've observed is that we always receive
         # exactly one pause event. I'm not entirely sure it's reliable, but
         # until it's disproven I'm treating it as such.
@@ -323,29 +386,47 @@ class Client(asyncio.Protocol):
         # there are an unspecified number of events, we will need to resort to
         # timeouts.
 
-        if previous == State.UNSUBSCRIBING:
-            if not (state == State.PAUSED_A or state == State.PAUSED_B):
+        if previous is _UNSUBSCRIBING:
+            if not (state is _PAUSED_A or state is _PAUSED_B):
                 raise SubscriptionError(f"Unexpected state {state} while unsubscribing")
-            state = State.UNSUBSCRIBED
+            state = _UNSUBSCRIBED
 
-        if previous == State.UNSUBSCRIBED and state != State.SUBSCRIBING:
+        if previous is _UNSUBSCRIBED and state is not _SUBSCRIBING:
             raise SubscriptionError(f"Unexpected state {state} while unsubscribed")
 
         self.state = state
 
-        if state != previous:
-            if state == State.SUBSCRIBED:
-                self.events.emit("subscribed")
-
-            self.events.emit("state", state)
-
-            if state == State.UNSUBSCRIBED:
-                self.events.emit("unsubscribed")
-
-            for rcv in list(self._receivers):
-                rcv.put_nowait((None, state))
-
-        if state == State.UNSUBSCRIBED:
+        if state is not previous:
+            emit = self.events.emit
+
+            if state is _SUBSCRIBED:
+                emit("subscribed")
+
+            # State handlers are called directly, rather than through the
+            # event emitter. They're indexed by state, so only the handlers for
+            # this state are called - most of the time zero or one of them.
+            listeners = self._state_listeners.get(state)
+            if listeners is not None:
+                if len(listeners) == 1:
+                    listeners[0](state)
+                else:
+                    # Handlers may add or remove handlers when called - for
+                    # instance, listens_once handlers remove themselves - so
+                    # call the handlers registered when the state arrived
+                    for listener in tuple(listeners):
+                        listener(state)
+
+            emit("state", state)
+
+            if state is _UNSUBSCRIBED:
+                emit("unsubscribed")
+
+            # Delivering states doesn't add or remove receivers, so there's no
+            # need to copy the list first
+            for rcv in self._receivers:
+                rcv._offer((None, state))
+
+        if state is _UNSUBSCRIBED:
             for rcv in list(self._receivers):
                 rcv.close()
 
@@ -361,14 +442,12 @@ class Client(asyncio.Protocol):
         Decorate an event handler to be called on a given state.
         """
 
-        want = state
-
         def decorator(f: StateHandler) -> Handler:
             def handler(state: State) -> None:
-                if state == want:
-                    f()
+                f()
 
-            return self.events.add_listener("state", handler)
+            self._add_listener(state, handler)
+            return handler
 
         return decorator
 
@@ -384,56 +463,110 @@ class Client(asyncio.Protocol):
         Decorate an event handler to be called once a given state occurs.
         """
 
-        want = state
-
         def decorator(f: StateHandler) -> Handler:
             def handler(state: State) -> None:
-                if state == want:
-                    f()
-                    self.events.remove_listener("state", handler)
+                f()
+                self.remove_listener(handler)
 
-            return self.events.add_listener("state", handler)
+            self._add_listener(state, handler)
+            return handler
 
         return decorator
 
+    def remove_listener(self: Self, handler: Handler) -> None:
+        """
+        Remove an event handler created with client.on, client.once,
+        client.listens_to or client.listens_once.
+        """
+
+        for state, listeners in self._state_listeners.items():
+            if handler in listeners:
+                listeners.remove(handler)
+                if not listeners:
+                    del self._state_listeners[state]
+                return
+
+    def _add_listener(self: Self, state: State, handler: Handler) -> None:
+        listeners = self._state_listeners.get(state)
+        if listeners is None:
+            self._state_listeners[state] = [handler]
+        else:
+            listeners.append(handler)
+
     def wait_for(
         self: Self, state: State, timeout: Optional[float] = None
     ) -> asyncio.Future[None]:
         """
         Wait for a given state to emit. This is a low level method - client.subscribe
         and the Receiver interface will meet most use cases.
+
+        If the client is already in the given state, the returned future is
+        resolved immediately.
         """
 
         fut = self.loop.create_future()
 
+        if self.state == state:
+            fut.set_result(None)
+            return fut
+
         @self.listens_once(state)
         def listener() -> None:
-            fut.set_result(None)
+            if not fut.done():
+                fut.set_result(None)
 
-        return asyncio.ensure_future(asyncio.wait_for(fut, timeout=timeout))
+        # Don't leave the listener behind if the future is cancelled
+        fut.add_done_callback(lambda _: self.remove_listener(listener))
+
+        if timeout is not None:
+            # Time out with a timer on the loop, rather than wrapping the
+            # future in asyncio.wait_for and a task
+            def on_timeout() -> None:
+                if not fut.done():
+                    fut.set_exception(TimeoutError())
+
+            timer = self.loop.call_later(timeout, on_timeout)
+            fut.add_done_callback(lambda _: timer.cancel())
+
+        return fut
 
     async def subscribe(self: Self, maxsize: int = 0) -> Receiver:
         """
         Subscribe to state changes.
+
+        When `maxsize` is set, it only limits calls to the receiver's `put`.
+        States and errors from the client are never dropped: any which arrive
+        while the receiver is full are held, in order, until there's room, and
+        are counted by `qsize`.
         """
 
         rcv = Receiver(client=self, maxsize=maxsize)
-        self._receivers.add(rcv)
+        self._receivers.append(rcv)
 
-        if self.state == State.UNSUBSCRIBED:
-            # Automatically subscribe
-            fut = self.wait_for(State.SUBSCRIBED)
-            self.send(Command.SUBSCRIBE)
-            await fut
-        elif self.state == State.SUBSCRIBING:
-            # Wait for in-progress subscription to complete
-            await self.wait_for(State.SUBSCRIBED)
+        if self.state in {State.UNSUBSCRIBED, State.SUBSCRIBING}:
+            # Automatically subscribe, or wait for an in-progress subscription
+            # to complete
+            await asyncio.shield(self._wait_subscribed())
         else:
             # Must already be subscribed
             pass
 
         return rcv
 
+    # A future which resolves once subscribed, shared between concurrent
+    # callers. Sends the subscribe command if not yet subscribing.
+    def _wait_subscribed(self: Self) -> asyncio.Future[None]:
+        fut = self._subscribed
+
+        if fut is None or fut.done():
+            fut = self.wait_for(State.SUBSCRIBED)
+            self._subscribed = fut
+
+            if self.state == State.UNSUBSCRIBED:
+                self.send(Command.SUBSCRIBE)
+
+        return fut
+
     def receivers(self: Self) -> List[Receiver]:
         """
         Currently active receivers.
@@ -453,7 +586,7 @@ class Client(asyncio.Protocol):
 
         # Wait until subscribed in order to avoid whacky state
         if self.state == State.SUBSCRIBING:
-            await self.wait_for(State.SUBSCRIBED)
+            await asyncio.shield(self._wait_subscribed())
 
         self.send(Command.UNSUBSCRIBE)
 
@@ -474,14 +607,19 @@ class Client(asyncio.Protocol):
 async def create_connection(
     port: str,
     loop: Optional[asyncio.AbstractEventLoop] = None,
+    low_latency: bool = True,
 ) -> Client:
     """
     Create a connection to the Plus Deck 2C.
+
+    When `low_latency` is True, the serial port is put into low latency mode
+    where supported. This lowers the latency timer on USB serial adapters, so
+    that state changes are delivered as soon as they're sent.
     """
 
     _loop = loop if loop else asyncio.get_running_loop()
 
-    _, client = await create_serial_connection(
+    transport, client = await create_serial_connection(
         _loop,
         lambda: Client(_loop),
         port,
@@ -491,6 +629,16 @@ async def create_connection(
         stopbits=STOPBITS_ONE,
     )
 
+    # create_serial_connection is typed as returning any asyncio.Protocol
+    client = cast(Client, client)
+
+    if low_latency and transport.serial:
+        try:
+            transport.serial.set_low_latency_mode(True)
+        except (AttributeError, NotImplementedError, OSError, ValueError):
+            # Not supported by the platform or the serial driver
+            pass
+
     await client._connection_made
 
     return client
@@ -500,6 +648,7 @@ async def create_connection(
 async def connection(
     port: str,
     loop: Optional[asyncio.AbstractEventLoop] = None,
+    low_latency: bool = True,
 ) -> AsyncGenerator[Client, None]:
     """
     Create a connection to Plus Deck 2C, with an associated async context.
@@ -508,7 +657,7 @@ async def connection(
     connection to close.
     """
 
-    client = await create_connection(port, loop=loop)
+    client = await create_connection(port, loop=loop, low_latency=low_latency)
 
     yield client
 
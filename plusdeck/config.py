@@ -1,5 +1,4 @@
 from configurence import BaseConfig, config, field, global_file
-from serial.tools.list_ports import comports
 
 """
 Configuration management for the Plus Deck 2C PC Cassette Deck. The client
@@ -14,6 +13,8 @@ GLOBAL_FILE = global_file(APP_NAME)
 def default_port() -> str:
     """Get a default serial port."""
 
+    from serial.tools.list_ports import comports
+
     return comports(include_links=True)[0].device
 
 
@@ -3,17 +3,23 @@ from dataclasses import dataclass
 import functools
 import logging
 import os
-from pathlib import Path
-import shlex
-import shutil
-import subprocess
 import sys
 from typing import Any, cast, List, Optional, Self
-from unittest.mock import Mock
 
 import click
 
-from plusdeck.cli import async_command, AsyncCommand, echo, LogLevel, OutputMode, STATE
+from plusdeck.cli import (
+    async_command,
+    AsyncCommand,
+    echo,
+    LOG_LEVEL,
+    LOG_LEVELS,
+    LogLevel,
+    OUTPUT,
+    OutputMode,
+    run,
+    STATE,
+)
 from plusdeck.client import State
 from plusdeck.config import Config
 from plusdeck.dbus.config import StagedConfig
@@ -22,18 +28,30 @@ from plusdeck.dbus.interface import DBUS_NAME, DbusInterface
 logger = logging.getLogger(__name__)
 
 
+class _NoClient:
+    """
+    A stand-in for the Plus Deck 2C client. The dbus client talks to the
+    service, so it never has a client of its own.
+    """
+
+    def __getattr__(self: Self, name: str) -> Any:
+        raise NotImplementedError(f"client.{name}")
+
+
 class DbusClient(DbusInterface):
     """
     Plus Deck 2C dbus client.
     """
 
     def __init__(self: Self) -> None:
-        client = Mock(name="client", side_effect=NotImplementedError("client"))
-        self.subscribe = Mock(name="client.subscribe")
-        super().__init__("", client)
+        super().__init__("", cast(Any, _NoClient()))
 
         cast(Any, self)._proxify(DBUS_NAME, "/")
 
+    def subscribe(self: Self) -> None:
+        # State changes come from the service's state signal
+        pass
+
     async def staged_config(self: Self) -> StagedConfig:
         file, port = await self.config
 
@@ -45,7 +63,7 @@ class DbusClient(DbusInterface):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class Obj:
     """
     The main click context object. Includes a dbus client and the ability to load
@@ -90,12 +108,17 @@ def should_sudo(config_file: str) -> bool:
 
 def run_config_command(obj: Obj, staged: StagedConfig, argv: List[str]) -> None:
     """
-    Run a config command in a subprocess. This allows for the use of sudo, if
-    necessary.
+    Run a config command in a subprocess with sudo. This is used when the
+    config file is owned by another user.
     """
 
+    from pathlib import Path
+    import shlex
+    import subprocess
+
     plusdeck_bin = str(Path(__file__).parent.parent / "cli.py")
     args: List[str] = [
+        "sudo",
         sys.executable,
         plusdeck_bin,
         "--config-file",
@@ -107,9 +130,6 @@ def run_config_command(obj: Obj, staged: StagedConfig, argv: List[str]) -> None:
         "config",
     ] + argv
 
-    if should_sudo(staged.file):
-        args.insert(0, "sudo")
-
     try:
         logger.debug(f"Running command: {shlex.join(args)}")
         subprocess.run(args, capture_output=False, check=True)
@@ -119,6 +139,8 @@ def run_config_command(obj: Obj, staged: StagedConfig, argv: List[str]) -> None:
 
 
 def warn_dirty() -> None:
+    import shutil
+
     msg = "The service configuration is out of sync. "
 
     if shutil.which("systemctl"):
@@ -138,13 +160,13 @@ def warn_dirty() -> None:
 @click.option(
     "--log-level",
     envvar="PLUSDECK_LOG_LEVEL",
-    type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]),
+    type=LOG_LEVEL,
     default="INFO",
     help="Set the log level",
 )
 @click.option(
     "--output",
-    type=click.Choice(["text", "json"]),
+    type=OUTPUT,
     default="text",
     help="Output either human-friendly text or JSON",
 )
@@ -158,7 +180,7 @@ def main(
     Control your Plus Deck 2C Cassette Drive through dbus.
     """
 
-    logging.basicConfig(level=getattr(logging, log_level))
+    logging.basicConfig(level=LOG_LEVELS[log_level])
 
     # Set the output mode for echo
     echo.mode = output
@@ -167,7 +189,7 @@ def main(
         client = DbusClient()
         ctx.obj = Obj(client=client, log_level=log_level, output=output)
 
-    asyncio.run(load())
+    run(load())
 
 
 @main.group()
@@ -222,7 +244,12 @@ async def set(obj: Obj, staged: StagedConfig, name: str, value: str) -> None:
     """
 
     try:
-        run_config_command(obj, staged, ["set", name, value])
+        if should_sudo(staged.file):
+            run_config_command(obj, staged, ["set", name, value])
+        else:
+            # No need to pay for a second interpreter when the file is ours
+            staged.set(name, value)
+            staged.to_file()
     except ValueError as exc:
         echo(str(exc))
         sys.exit(1)
@@ -1,4 +1,3 @@
-import asyncio
 import logging
 
 import click
@@ -6,7 +5,7 @@ from sdbus import (  # pyright: ignore [reportMissingModuleSource]
     request_default_bus_name_async,
 )
 
-from plusdeck.cli import LogLevel
+from plusdeck.cli import LOG_LEVEL, LOG_LEVELS, LogLevel, run
 from plusdeck.config import GLOBAL_FILE
 from plusdeck.dbus.interface import DBUS_NAME, DbusInterface, load_client
 
@@ -46,14 +45,14 @@ async def serve(config_file: str) -> None:
 @click.option(
     "--log-level",
     envvar="PLUSDECK_LOG_LEVEL",
-    type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]),
+    type=LOG_LEVEL,
     default="INFO",
     help="Set the log level",
 )
 def main(config_file: str, log_level: LogLevel) -> None:
-    logging.basicConfig(level=getattr(logging, log_level))
+    logging.basicConfig(level=LOG_LEVELS[log_level])
 
-    asyncio.run(serve(config_file))
+    run(serve(config_file))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+from enum import Enum
+from typing import Dict, List, Optional, Tuple, Type
+
+"""
+Commands and states in the Plus Deck 2C PC Cassette Deck's serial protocol.
+These are re-exported by the client, but live in their own module so that they
+may be imported without the client's dependencies.
+"""
+
+
+class Command(Enum):
+    """A command for the Plus Deck 2C PC Cassette Deck."""
+
+    PLAY_A = b"\x01"
+    PLAY_B = b"\x02"
+    FAST_FORWARD_A = b"\x03"
+    FAST_FORWARD_B = b"\x04"
+    PAUSE = b"\x05"
+    STOP = b"\x06"
+    EJECT = b"\x08"
+    SUBSCRIBE = b"\x0b"
+    UNSUBSCRIBE = b"\x0c"
+
+    @classmethod
+    def from_bytes(cls: Type["Command"], buffer: bytes) -> List["Command"]:
+        commands: List[Command] = []
+        for code in buffer:
+            command = _COMMAND_BY_CODE.get(code)
+            if command is None:
+                raise ValueError(f"{code} is not a valid Command")
+            commands.append(command)
+        return commands
+
+    @classmethod
+    def from_byte(cls: Type["Command"], buffer: bytes) -> "Command":
+        if len(buffer) != 1:
+            raise ValueError("Can not convert multiple bytes into a single Command")
+        code = buffer[0]
+        command = _COMMAND_BY_CODE.get(code)
+        if command is None:
+            raise ValueError(f"{code} is not a valid Command")
+        return command
+
+    def to_bytes(self: "Command") -> bytes:
+        return self.value
+
+
+# Commands indexed by their byte code
+_COMMAND_BY_CODE: Dict[int, Command] = {
+    command.value[0]: command for command in Command
+}
+
+
+class State(Enum):
+    """The state of the Plus Deck 2C PC Cassette Deck."""
+
+    PLAYING_A = 10
+    PAUSED_A = 12
+    PLAYING_B = 20
+    SUBSCRIBED = 21
+    PAUSED_B = 22
+    FAST_FORWARDING_A = 30
+    FAST_FORWARDING_B = 40
+    STOPPED = 50
+    EJECTED = 60
+    SUBSCRIBING = -1
+    UNSUBSCRIBING = -2
+    UNSUBSCRIBED = -3
+
+    @classmethod
+    def from_bytes(cls: Type["State"], buffer: bytes) -> List["State"]:
+        states: List[State] = []
+        for code in buffer:
+            state = _STATE_BY_CODE[code]
+            if state is None:
+                raise ValueError(f"{code} is not a valid State")
+            states.append(state)
+        return states
+
+    @classmethod
+    def from_byte(cls: Type["State"], buffer: bytes) -> "State":
+        if len(buffer) != 1:
+            raise ValueError("Can not convert multiple bytes to a single State")
+        code = buffer[0]
+        state = _STATE_BY_CODE[code]
+        if state is None:
+            raise ValueError(f"{code} is not a valid State")
+        return state
+
+    def to_bytes(self: "State") -> bytes:
+        code = _BYTES_BY_STATE.get(self)
+        if code is None:
+            raise ValueError(f"Can not convert {self} to bytes")
+        return code
+
+
+# States indexed by their byte code, for decoding data from the Plus Deck 2C
+# without going through the Enum constructor
+_STATE_BY_VALUE: Dict[int, State] = {state.value: state for state in State}
+_STATE_BY_CODE: Tuple[Optional[State], ...] = tuple(
+    _STATE_BY_VALUE.get(code) for code in range(256)
+)
+
+# Byte codes indexed by state, for the states sent by the Plus Deck 2C
+_BYTES_BY_STATE: Dict[State, bytes] = {
+    state: state.value.to_bytes() for state in State if state.value >= 0
+}
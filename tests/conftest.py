@@ -14,6 +14,7 @@ import plusdeck.config
 async def client():
     client = Client()
     client._transport = Mock(name="client._transport")
+    client._write = client._transport.write
     client.state = State.SUBSCRIBED
     return client
 
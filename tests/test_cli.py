@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+from dataclasses import dataclass, field
+from typing import Any, cast, Dict, List, Tuple
+
+import pytest
+
+from plusdeck.cli import as_json, Echo
+from plusdeck.client import State
+from plusdeck.config import Config, GLOBAL_FILE
+
+try:
+    from plusdeck.dbus.config import StagedConfig
+except ImportError:
+    StagedConfig = None
+
+cfg_cls = cast(Any, Config)
+
+
+@dataclass
+class Tape:
+    name: str
+    side: State
+
+
+@dataclass
+class Deck:
+    state: State
+    tape: Tape
+    history: List[State]
+    sides: Tuple[State, ...]
+    counters: Dict[str, State] = field(default_factory=dict)
+
+
+@dataclass
+class WithAsDict:
+    state: State
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(state="as_dict")
+
+
+def test_as_json_nested_dataclass() -> None:
+    """Converts nested dataclasses, including their Enum fields."""
+
+    deck = Deck(
+        state=State.PLAYING_A,
+        tape=Tape(name="Mixtape", side=State.PLAYING_B),
+        history=[State.STOPPED, State.PLAYING_A],
+        sides=(State.PLAYING_A, State.PLAYING_B),
+        counters={"a": State.PAUSED_A},
+    )
+
+    assert as_json(deck) == {
+        "state": "PLAYING_A",
+        "tape": {"name": "Mixtape", "side": "PLAYING_B"},
+        "history": ["STOPPED", "PLAYING_A"],
+        "sides": ["PLAYING_A", "PLAYING_B"],
+        "counters": {"a": "PAUSED_A"},
+    }
+
+
+def test_as_json_states() -> None:
+    """Converts a list of states into their names."""
+
+    assert as_json([State.SUBSCRIBED, State.STOPPED, State.EJECTED]) == [
+        "SUBSCRIBED",
+        "STOPPED",
+        "EJECTED",
+    ]
+
+
+def test_as_json_atomic() -> None:
+    """Passes through values which are already JSON-serializable."""
+
+    for value in ["port", 1, 1.5, True, None]:
+        assert as_json(value) == value
+
+
+def test_as_json_dataclass_before_as_dict() -> None:
+    """Converts dataclasses from their fields, even if they define as_dict."""
+
+    assert as_json(WithAsDict(state=State.STOPPED)) == {"state": "STOPPED"}
+
+
+def test_as_json_config() -> None:
+    """Converts a config into a dict of its fields."""
+
+    config = cfg_cls(file=GLOBAL_FILE, port="/dev/ttyS0")
+
+    assert as_json(config) == {"file": GLOBAL_FILE, "port": "/dev/ttyS0"}
+
+
+@pytest.mark.skipif(StagedConfig is None, reason="dbus is not installed")
+def test_as_json_staged_config() -> None:
+    """Converts a staged config with its as_dict method."""
+
+    cls = cast(Any, StagedConfig)
+    staged = cls(
+        active_config=cfg_cls(file=GLOBAL_FILE, port="/dev/ttyS0"),
+        target_config=cfg_cls(file=GLOBAL_FILE, port="/dev/ttyS4"),
+    )
+
+    assert as_json(staged) == {
+        "file": {"type": None, "active": GLOBAL_FILE, "target": GLOBAL_FILE},
+        "port": {"type": "set", "active": "/dev/ttyS0", "target": "/dev/ttyS4"},
+    }
+
+
+class Name(str):
+    pass
+
+
+@pytest.mark.parametrize(
+    "obj,output",
+    [
+        ("hello", "hello"),
+        (Name("hello"), "hello"),
+        (State.PLAYING_A, "PLAYING_A"),
+        (1, "1"),
+        (["hello"], "['hello']"),
+    ],
+)
+def test_echo_text(capsys, obj: Any, output: str) -> None:
+    """Writes strings as-is, states by name and anything else as its repr."""
+
+    echo = Echo()
+    echo(obj)
+
+    assert capsys.readouterr().out == output + "\n"
@@ -5,9 +5,18 @@ from typing import cast, List, Optional
 from unittest.mock import call, Mock
 
 import pytest
-from serial_asyncio import SerialTransport
-
-from plusdeck.client import Client, Command, State, SubscriptionError
+from serial_asyncio_fast import SerialTransport
+
+import plusdeck.client
+from plusdeck.client import (
+    Client,
+    Command,
+    create_connection,
+    Receiver,
+    State,
+    StateError,
+    SubscriptionError,
+)
 
 TEST_TIMEOUT = 0.01
 
@@ -27,6 +36,37 @@ async def test_online(client: Client) -> None:
     await asyncio.wait_for(client._connection_made, timeout=TEST_TIMEOUT)
 
 
+@pytest.fixture
+def serial_connection(monkeypatch) -> Mock:
+    transport = Mock(name="transport")
+
+    async def create_serial_connection(loop, protocol_factory, port, **kwargs):
+        client = protocol_factory()
+        client._connection_made.set_result(None)
+        return transport, client
+
+    monkeypatch.setattr(
+        plusdeck.client, "create_serial_connection", create_serial_connection
+    )
+
+    return transport
+
+
+@pytest.mark.parametrize("low_latency", [True, False])
+@pytest.mark.asyncio
+async def test_create_connection_low_latency(
+    serial_connection: Mock, low_latency: bool
+) -> None:
+    """Enables low latency mode on the serial port unless told not to."""
+
+    await create_connection("/dev/ttyUSB0", low_latency=low_latency)
+
+    if low_latency:
+        serial_connection.serial.set_low_latency_mode.assert_called_once_with(True)
+    else:
+        serial_connection.serial.set_low_latency_mode.assert_not_called()
+
+
 @pytest.mark.parametrize(
     "command,code",
     [(command, command.to_bytes()) for command in Command],
@@ -39,6 +79,14 @@ async def test_command(client: Client, command: Command, code: bytes) -> None:
     cast(Mock, client._transport.write).assert_called_with(code)
 
 
+@pytest.mark.parametrize("command", list(Command))
+def test_command_from_byte(command: Command) -> None:
+    """Decodes a Command from its byte code."""
+
+    assert Command.from_byte(command.to_bytes()) == command
+    assert Command.from_bytes(command.to_bytes() * 2) == [command, command]
+
+
 @pytest.mark.parametrize(
     "state,data",
     [
@@ -72,6 +120,16 @@ async def test_state_events(client: Client, state: State, data: bytes) -> None:
     assert received and received == state
 
 
+@pytest.mark.asyncio
+async def test_unknown_state(client: Client) -> None:
+    """Raises an error on an unknown state code."""
+
+    client.data_received(b"\xff")
+
+    with pytest.raises(StateError):
+        await client.closed
+
+
 @pytest.mark.asyncio
 async def test_subscription_events(client: Client) -> None:
     """Emits subscription events."""
@@ -183,6 +241,31 @@ async def test_on(client: Client) -> None:
     assert client.state == State.PAUSED_A
 
 
+@pytest.mark.asyncio
+async def test_remove_listener(client: Client) -> None:
+    """Removes a handler."""
+
+    call_count = 0
+
+    def handler() -> None:
+        nonlocal call_count
+        call_count += 1
+
+    listener = client.on(State.PLAYING_A, handler)
+
+    client.data_received(b"\x0a")
+
+    assert call_count == 1
+
+    client.remove_listener(listener)
+
+    client.data_received(b"\x32\x0a")
+
+    assert call_count == 1
+    assert client.state == State.PLAYING_A
+    assert client._state_listeners == dict()
+
+
 @pytest.mark.asyncio
 async def test_listens_once(client: Client) -> None:
     """Listens for state once."""
@@ -215,6 +298,67 @@ async def test_listens_once(client: Client) -> None:
     assert client.state == State.PAUSED_A
 
 
+@pytest.mark.asyncio
+async def test_many_listeners(client: Client) -> None:
+    """Calls every handler when some are removed during dispatch."""
+
+    calls: List[str] = []
+
+    client.once(State.PLAYING_A, lambda: calls.append("once 1"))
+    client.on(State.PLAYING_A, lambda: calls.append("on"))
+    client.once(State.PLAYING_A, lambda: calls.append("once 2"))
+
+    client.data_received(b"\x0a")
+
+    assert calls == ["once 1", "on", "once 2"]
+
+    client.data_received(b"\x32\x0a")
+
+    assert calls == ["once 1", "on", "once 2", "on"]
+
+
+@pytest.mark.asyncio
+async def test_listener_added_during_dispatch(client: Client) -> None:
+    """Doesn't call handlers added while handling the same state."""
+
+    calls: List[str] = []
+
+    def rearm() -> None:
+        calls.append("rearm")
+        client.once(State.PLAYING_A, rearm)
+
+    client.on(State.PLAYING_A, lambda: calls.append("on"))
+    client.once(State.PLAYING_A, rearm)
+
+    client.data_received(b"\x0a")
+
+    assert calls == ["on", "rearm"]
+
+    client.data_received(b"\x32\x0a")
+
+    assert calls == ["on", "rearm", "on", "rearm"]
+
+
+@pytest.mark.asyncio
+async def test_once_added_during_once(client: Client) -> None:
+    """Calls a handler added by a once handler on the next matching state."""
+
+    calls: List[str] = []
+
+    def add_inner() -> None:
+        client.once(State.PLAYING_A, lambda: calls.append("inner"))
+
+    client.once(State.PLAYING_A, add_inner)
+
+    client.data_received(b"\x0a")
+
+    assert calls == []
+
+    client.data_received(b"\x32\x0a")
+
+    assert calls == ["inner"]
+
+
 @pytest.mark.asyncio
 async def test_once(client: Client) -> None:
     """Calls handler once."""
@@ -272,6 +416,36 @@ async def test_wait_for(client: Client, state: State) -> None:
     await fut
 
 
+@pytest.mark.asyncio
+async def test_wait_for_cleanup(client: Client) -> None:
+    """Doesn't leave listeners behind."""
+
+    fut = client.wait_for(State.STOPPED, timeout=TEST_TIMEOUT)
+
+    client.data_received(b"\x32")
+
+    await fut
+
+    assert client._state_listeners == dict()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await client.wait_for(State.EJECTED, timeout=TEST_TIMEOUT)
+
+    assert client._state_listeners == dict()
+
+
+@pytest.mark.asyncio
+async def test_wait_for_current_state(client: Client) -> None:
+    """Resolves immediately when already in the given state."""
+
+    client.state = State.STOPPED
+
+    fut = client.wait_for(State.STOPPED, timeout=TEST_TIMEOUT)
+
+    assert fut.done()
+    await fut
+
+
 @pytest.mark.asyncio
 async def test_subscribe_when_unsubscribed(client: Client) -> None:
     """Waits for subscribed event when subscribing."""
@@ -298,6 +472,26 @@ async def test_subscribe_when_unsubscribed(client: Client) -> None:
     assert client.state == State.SUBSCRIBED
 
 
+@pytest.mark.asyncio
+async def test_concurrent_subscribe(client: Client) -> None:
+    """Sends the subscribe command once for concurrent subscribers."""
+
+    client.state = State.UNSUBSCRIBED
+
+    subscribing = asyncio.gather(client.subscribe(), client.subscribe())
+
+    # Let both subscribers start waiting
+    await asyncio.sleep(0)
+
+    client.data_received(b"\x15")
+
+    rcv1, rcv2 = await asyncio.wait_for(subscribing, timeout=TEST_TIMEOUT)
+
+    assert set(client.receivers()) == {rcv1, rcv2}
+    assert client._transport is not None
+    cast(Mock, client._transport.write).assert_called_once_with(b"\x0b")
+
+
 @pytest.mark.parametrize("state", [State.EJECTED, State.SUBSCRIBED])
 @pytest.mark.asyncio
 async def test_subscribe_when_subscribed(client: Client, state: State) -> None:
@@ -503,6 +697,21 @@ async def test_unsubscribe(client: Client, buffer) -> None:
         await asyncio.wait_for(rcv.get_state(), timeout=TEST_TIMEOUT)
 
 
+@pytest.mark.parametrize("chunks", [[b"\x0c\x0c"], [b"\x0c", b"\x0c"]])
+@pytest.mark.asyncio
+async def test_unsubscribe_repeated_pause(client: Client, chunks: List[bytes]) -> None:
+    """Fails on a repeated pause, however the data is chunked."""
+
+    client.state = State.UNSUBSCRIBING
+
+    for chunk in chunks:
+        client.data_received(chunk)
+
+    assert client.state == State.UNSUBSCRIBED
+    assert client.closed.done()
+    assert isinstance(client.closed.exception(), SubscriptionError)
+
+
 @pytest.mark.parametrize(
     "state",
     [
@@ -674,3 +883,75 @@ async def test_session_iterator(client: Client) -> None:
         State.SUBSCRIBED,
         State.PLAYING_A,
     ]
+
+
+@pytest.mark.asyncio
+async def test_bounded_receiver(client: Client) -> None:
+    """Holds states for a full receiver until it has room."""
+
+    client.state = State.EJECTED
+
+    rcv = await asyncio.wait_for(client.subscribe(maxsize=1), timeout=TEST_TIMEOUT)
+
+    client.data_received(b"\x32\x0a")
+
+    assert (await asyncio.wait_for(rcv.get_state(), timeout=TEST_TIMEOUT)) == (
+        State.STOPPED
+    )
+    assert (await asyncio.wait_for(rcv.get_state(), timeout=TEST_TIMEOUT)) == (
+        State.PLAYING_A
+    )
+
+    # States delivered while full stay in order, even when more arrive after
+    # the receiver has made room
+    client.data_received(b"\x32\x0a")
+
+    assert rcv.qsize() == 2
+    assert rcv.full()
+    assert rcv.get_nowait() == (None, State.STOPPED)
+
+    client.data_received(b"\x14")
+
+    assert rcv.qsize() == 2
+    assert (await asyncio.wait_for(rcv.get_state(), timeout=TEST_TIMEOUT)) == (
+        State.PLAYING_A
+    )
+    assert (await asyncio.wait_for(rcv.get_state(), timeout=TEST_TIMEOUT)) == (
+        State.PLAYING_B
+    )
+    assert rcv.empty()
+    assert client.state == State.PLAYING_B
+
+
+@pytest.mark.asyncio
+async def test_receiver_queue(client: Client) -> None:
+    """Puts and gets events in order."""
+
+    rcv = Receiver(client, maxsize=1)
+
+    assert rcv.empty()
+
+    with pytest.raises(asyncio.QueueEmpty):
+        rcv.get_nowait()
+
+    rcv.put_nowait((None, State.STOPPED))
+
+    assert rcv.full()
+
+    with pytest.raises(asyncio.QueueFull):
+        rcv.put_nowait((None, State.EJECTED))
+
+    put = asyncio.ensure_future(rcv.put((None, State.EJECTED)))
+
+    assert (await asyncio.wait_for(rcv.get(), timeout=TEST_TIMEOUT)) == (
+        None,
+        State.STOPPED,
+    )
+
+    await asyncio.wait_for(put, timeout=TEST_TIMEOUT)
+
+    assert rcv.qsize() == 1
+    assert (await asyncio.wait_for(rcv.get(), timeout=TEST_TIMEOUT)) == (
+        None,
+        State.EJECTED,
+    )